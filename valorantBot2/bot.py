@@ -1,17 +1,29 @@
+import asyncio
+import contextlib
+import hashlib
 import os
-import threading
+from pathlib import Path
+from typing import Iterator
+
+import orjson
 
 import uvicorn
 from dotenv import load_dotenv
 import discord
 from discord.ext import commands
 
+# .env は自前モジュールより先に読む（get_store / cookiesDB は import 時に環境変数を読む）
+load_dotenv()
+
 # bot.py
 from valorantBot2.rec import app as rec_app
+from valorantBot2.services.get_store import prewarm as prewarm_store
 
 
-load_dotenv()
 TOKEN = os.getenv("DISCORD_TOKEN")
+# 起動案内の固定送信先（未設定/不正値なら None）
+_scid = os.getenv("STARTUP_CHANNEL_ID")
+STARTUP_CHANNEL_ID: int | None = int(_scid) if _scid and _scid.isdigit() else None
 
 intents = discord.Intents.default()
 intents.guilds = True  # 起動時の送信先探索で使用
@@ -21,27 +33,34 @@ intents.voice_states = True
 intents.message_content = True
 bot = commands.Bot(command_prefix="!", intents=intents)
 
+# 前回同期したスラッシュコマンド定義のハッシュ（変化が無ければ tree.sync を省略）
+TREE_HASH_FILE = Path(".cmd_tree_hash")
+
 # 起動時案内の重複送信防止フラグ
 bot._announced = False  # type: ignore[attr-defined]
 
 
-def run_api_server() -> None:
-    """Start the FastAPI server in a background thread."""
-    port = int(os.getenv("PORT", "8190"))
+class _EmbeddedServer(uvicorn.Server):
+    """discord.py と同じイベントループ上で動かす uvicorn サーバー。"""
+
+    # uvicorn はシグナルを自前で奪うので、Ctrl+C / SIGTERM は discord.py 側に任せる。
+    # 現行 (>=0.29) は capture_signals() で signal.signal() を差し替え、
+    # 古い版は install_signal_handlers() で loop に登録する。両方とも無効化する。
+    @contextlib.contextmanager
+    def capture_signals(self) -> Iterator[None]:
+        yield
 
-    # uvicorn.run() sets signal handlers which fail in a child thread. To
-    # allow the API server to run alongside the Discord bot, create a server
-    # instance and disable its signal handler installation.
-    config = uvicorn.Config(rec_app, host="0.0.0.0", port=port, log_level="info")
-    server = uvicorn.Server(config)
-    server.install_signal_handlers = False
-    server.run()
+    def install_signal_handlers(self) -> None:
+        pass
 
 
-# Launch the API server so that the container exposes the endpoint while the
-# Discord bot runs. The thread is marked as daemon so it will not block
-# shutdown.
-threading.Thread(target=run_api_server, daemon=True).start()
+def start_api_server() -> asyncio.Task:
+    """Serve the FastAPI app as a task on the already running event loop."""
+    port = int(os.getenv("PORT", "8190"))
+    # loop="none": the loop is owned by discord.py, uvicorn must not replace it.
+    config = uvicorn.Config(rec_app, host="0.0.0.0", port=port, log_level="info", loop="none")
+    server = _EmbeddedServer(config)
+    return asyncio.create_task(server.serve())
 
 
 def build_startup_text() -> str:
@@ -54,6 +73,12 @@ def build_startup_text() -> str:
     )
 
 
+def _can_announce(ch: discord.abc.GuildChannel, me: discord.Member) -> bool:
+    """ch に案内を送れるか（ロール・チャンネル上書き・タイムアウトは permissions_for が解決する）"""
+    perms = ch.permissions_for(me)
+    return perms.send_messages and perms.view_channel
+
+
 def pick_startup_channel(guild: discord.Guild) -> discord.abc.Messageable | None:
     """ギルドごとに案内送信先チャンネルを決定:
     1) 環境変数 STARTUP_CHANNEL_ID がそのギルドのチャンネルならそこ
@@ -61,22 +86,23 @@ def pick_startup_channel(guild: discord.Guild) -> discord.abc.Messageable | None
     3) 最初に送信可能なテキストチャンネル
     """
     # 1) 固定チャンネルID
-    scid = os.getenv("STARTUP_CHANNEL_ID")
-    if scid and scid.isdigit():
-        ch = bot.get_channel(int(scid))
+    if STARTUP_CHANNEL_ID is not None:
+        ch = bot.get_channel(STARTUP_CHANNEL_ID)
         if isinstance(ch, discord.abc.Messageable) and getattr(ch, "guild", None) == guild:
             return ch
 
+    me = guild.me
+    if me is None:
+        return None
+
     # 2) ギルドのシステムチャンネル
-    if guild.system_channel:
-        perms = guild.system_channel.permissions_for(guild.me) if guild.me else None
-        if perms and perms.send_messages and perms.view_channel:
-            return guild.system_channel
+    system_channel = guild.system_channel
+    if system_channel and _can_announce(system_channel, me):
+        return system_channel
 
     # 3) 最初に送信可能なテキストチャンネル
     for ch in guild.text_channels:
-        perms = ch.permissions_for(guild.me) if guild.me else None
-        if perms and perms.send_messages and perms.view_channel:
+        if _can_announce(ch, me):
             return ch
 
     return None
@@ -92,12 +118,20 @@ async def on_ready():
         try:
             text = build_startup_text()
             missing: list[str] = []
+            targets: list[tuple[discord.Guild, discord.abc.Messageable]] = []
             for g in bot.guilds:
                 channel = pick_startup_channel(g)
                 if channel:
-                    await channel.send(text)
+                    targets.append((g, channel))
                 else:
                     missing.append(g.name)
+            # ギルドごとの送信は独立しているので並行で投げる（レート制限は discord.py 側で処理）
+            results = await asyncio.gather(
+                *(channel.send(text) for _, channel in targets), return_exceptions=True
+            )
+            for (g, _), res in zip(targets, results):
+                if isinstance(res, Exception):
+                    print(f"起動時コマンド一覧送信に失敗 ({g.name}):", res)
             if missing:
                 # 送信先が見つからないギルドがあればオーナーにDM
                 app_info = await bot.application_info()
@@ -112,18 +146,59 @@ async def on_ready():
             print("起動時コマンド一覧送信に失敗:", e)
 
 
+def _command_tree_hash() -> str:
+    """登録予定のグローバルコマンド定義から安定したハッシュを作る。"""
+    payload = []
+    for cmd in bot.tree.get_commands():
+        try:
+            payload.append(cmd.to_dict(bot.tree))
+        except TypeError:  # discord.py < 2.4
+            payload.append(cmd.to_dict())  # type: ignore[call-arg]
+    blob = orjson.dumps(
+        {"application_id": bot.application_id, "commands": payload},
+        option=orjson.OPT_SORT_KEYS,
+    )
+    return hashlib.blake2b(blob, digest_size=16).hexdigest()
+
+
+async def sync_command_tree() -> None:
+    """コマンド定義が前回の同期から変わったときだけ tree.sync を呼ぶ。"""
+    digest = _command_tree_hash()
+    try:
+        if TREE_HASH_FILE.read_text(encoding="utf-8").strip() == digest:
+            return
+    except OSError:
+        pass
+    await bot.tree.sync()
+    try:
+        TREE_HASH_FILE.write_text(digest, encoding="utf-8")
+    except OSError as e:
+        print("コマンド定義ハッシュの保存に失敗:", e)
+
+
 async def setup_hook():
+    # API サーバーを同じイベントループで起動（参照を保持してタスクの GC を防ぐ）
+    bot._api_task = start_api_server()  # type: ignore[attr-defined]
+    # スキン索引を裏で温めておく（最初の /store の待ち時間を減らす）
+    prewarm_store()
     # cogs/ui をロード
     await bot.load_extension("valorantBot2.cogs.ui")
-    # スラッシュコマンドを同期
-    await bot.tree.sync()
+    # スラッシュコマンドを同期（定義が変わったときのみ）
+    await sync_command_tree()
 
 
 bot.setup_hook = setup_hook
 
-if not TOKEN:
-    raise RuntimeError("DISCORD_TOKEN が .env に設定されていません。")
 
-bot.run(TOKEN)
+def main() -> None:
+    if not TOKEN:
+        raise RuntimeError("DISCORD_TOKEN が .env に設定されていません。")
+
+    # The API server is started from setup_hook so that it shares the bot's loop.
+    bot.run(TOKEN)
+
+
+if __name__ == "__main__":
+    main()
 
 
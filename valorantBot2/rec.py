@@ -1,22 +1,86 @@
 from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
-import time, secrets, re, os, logging
+import asyncio, base64, binascii, time, secrets, os, logging
+from collections import OrderedDict
+from contextlib import asynccontextmanager
 
-try:
-    # When executed as part of the package (e.g. ``python -m valorantBot2.rec``)
-    # the relative import works.  However, running the file directly can make
-    # ``__package__`` undefined which breaks the relative import.  Fallback to
-    # an absolute import so the FastAPI server can still start in that case.
-    from .services.cookiesDB import save_cookies, init_db
-except ImportError:  # pragma: no cover - fallback for standalone execution
-    from services.cookiesDB import save_cookies, init_db
+import orjson
+
+if __name__ == "__main__" and not __package__:  # pragma: no cover - ``python rec.py``
+    # Running the file directly leaves ``__package__`` empty, which breaks the
+    # relative import below.  Make the package importable and resolve imports
+    # exactly as ``python -m valorantBot2.rec`` would.
+    import sys
+    from pathlib import Path
+
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+    __package__ = "valorantBot2"
+
+from .services.cookiesDB import asave_cookies, init_db
 
 # ---- ログ設定（INFO以上を出力）----
 logging.basicConfig(level=logging.INFO)
 log = logging.getLogger(__name__)
 
-app = FastAPI()
+# 欠けているフィールドの既定値（読み取り専用で使い回す）
+_EMPTY: dict = {}
+
+# cookies.auth から保存する Riot cookie 名
+_AUTH_COOKIE_KEYS = ("ssid", "clid", "sub", "csid", "tdid")
+
+# nonce（生の 24 バイト）-> 有効期限。TTL が一定なので挿入順 = 期限順になり、先頭から掃除できる
+_nonces: "OrderedDict[bytes, float]" = OrderedDict()
+_NONCE_BYTES = 24
+NONCE_TTL = 180  # seconds
+NONCE_MAX = 100_000  # 未使用 nonce の上限（超えたら古いものから捨てる）
+NONCE_SWEEP_INTERVAL = 30  # seconds
+_NONCE_STR_LEN = 32  # 24 バイトの urlsafe base64（パディングなし）
+
+# /nonce のレスポンスは形が固定なので、JSON エンコードせずに連結で組み立てる
+# （urlsafe base64 はエスケープ不要な文字だけで構成される）
+_NONCE_PREFIX = b'{"nonce":"'
+_NONCE_SUFFIX = b'","expiry":' + str(NONCE_TTL).encode() + b"}"
+
+
+def _decode_nonce(n: object) -> bytes | None:
+    """クライアントから受け取った nonce 文字列を辞書キー（bytes）に戻す。"""
+    if not isinstance(n, str) or len(n) != _NONCE_STR_LEN:
+        return None
+    try:
+        return base64.urlsafe_b64decode(n)
+    except (binascii.Error, ValueError):
+        return None
+
+
+def _purge_expired_nonces(now: float) -> None:
+    """期限切れの nonce を先頭から捨てる（O(1)/件）。"""
+    while _nonces and next(iter(_nonces.values())) < now:
+        _nonces.popitem(last=False)
+
+
+async def _sweep_nonces() -> None:
+    """/nonce が呼ばれない間も期限切れ nonce を定期的に掃除する。"""
+    while True:
+        await asyncio.sleep(NONCE_SWEEP_INTERVAL)
+        _purge_expired_nonces(time.monotonic())
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    # Initialise the database table structure if possible.
+    try:
+        await asyncio.to_thread(init_db)
+    except Exception as exc:  # pragma: no cover - best effort
+        log.warning("DB init failed: %s", exc)
+    sweeper = asyncio.create_task(_sweep_nonces())
+    try:
+        yield
+    finally:
+        sweeper.cancel()
+
+
+app = FastAPI(default_response_class=ORJSONResponse, lifespan=lifespan)
 
 # CORS（拡張からのfetch想定。allow_originsは本番で絞るのが安全）
 app.add_middleware(
@@ -27,59 +91,61 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-_nonces = {}
-
-
-@app.on_event("startup")
-def _startup_init_db() -> None:
-    """Initialise the database table structure if possible."""
-    try:
-        init_db()
-    except Exception as exc:  # pragma: no cover - best effort
-        log.warning("DB init failed: %s", exc)
-
 @app.get("/nonce")
-def nonce():
-    n = secrets.token_urlsafe(24)
-    _nonces[n] = time.time() + 180
-    return {"nonce": n, "expiry": 180}
+async def nonce():
+    # 壁時計は NTP 補正で巻き戻り得るので単調時計で期限を管理する
+    now = time.monotonic()
+    _purge_expired_nonces(now)
+    if len(_nonces) >= NONCE_MAX:
+        _nonces.popitem(last=False)
+    raw = secrets.token_bytes(_NONCE_BYTES)
+    _nonces[raw] = now + NONCE_TTL
+    body = _NONCE_PREFIX + base64.urlsafe_b64encode(raw) + _NONCE_SUFFIX
+    return Response(content=body, media_type="application/json")
 
 @app.post("/riot-cookies")
 async def receive(req: Request):
-    data = await req.json()
+    try:
+        data = orjson.loads(await req.body())
+    except orjson.JSONDecodeError:
+        data = None
+    if not isinstance(data, dict):
+        return ORJSONResponse({"ok": False, "error": "invalid_json"}, status_code=400)
 
     # --- Nonce 検証 ---
-    n = data.get("nonce")
-    if not n or n not in _nonces or _nonces[n] < time.time():
-        return JSONResponse({"ok": False, "error": "invalid_or_expired_nonce"}, status_code=400)
-    del _nonces[n]
+    raw = _decode_nonce(data.get("nonce"))
+    exp = _nonces.pop(raw, None) if raw is not None else None
+    if exp is None or exp < time.monotonic():
+        return ORJSONResponse({"ok": False, "error": "invalid_or_expired_nonce"}, status_code=400)
 
     # --- Discord ユーザーID検証（数字のみ 5〜25桁を許容）---
-    user_id = str(data.get("user_id", "")).strip()
-    if not re.fullmatch(r"\d{5,25}", user_id):
-        return JSONResponse({"ok": False, "error": "invalid_user_id"}, status_code=400)
+    user_id = data.get("user_id", "")
+    if not isinstance(user_id, str):
+        user_id = str(user_id)
+    user_id = user_id.strip()
+    if not (5 <= len(user_id) <= 25 and user_id.isascii() and user_id.isdigit()):
+        return ORJSONResponse({"ok": False, "error": "invalid_user_id"}, status_code=400)
 
     # --- 保存する JSON を構築 ---
-    cookies = data.get("cookies", {}) or {}
-    a = cookies.get("auth", {}) or {}
-
-    cookie_json = {
-        "ssid": a.get("ssid"),
-        "clid": a.get("clid"),
-        "sub": a.get("sub"),
-        "csid": a.get("csid"),
-        "tdid": a.get("tdid"),
-        "puuid": cookies.get("puuid"),
-    }
+    cookies = data.get("cookies") or _EMPTY
+    if not isinstance(cookies, dict):
+        return ORJSONResponse({"ok": False, "error": "invalid_json"}, status_code=400)
+    a = cookies.get("auth") or _EMPTY
+    if not isinstance(a, dict):
+        return ORJSONResponse({"ok": False, "error": "invalid_json"}, status_code=400)
+
+    cookie_json = {k: a.get(k) for k in _AUTH_COOKIE_KEYS}
+    cookie_json["puuid"] = cookies.get("puuid")
 
     user_agent = req.headers.get("user-agent")
     last_ip = req.client.host if req.client else None
 
     try:
-        save_cookies(user_id, cookie_json, user_agent=user_agent, last_ip=last_ip)
+        # 同期 DB ドライバなのでスレッドプールで実行し、イベントループを塞がない
+        await asave_cookies(user_id, cookie_json, user_agent=user_agent, last_ip=last_ip)
     except Exception as exc:  # pragma: no cover - return JSON error if DB fails
         log.error("Failed to save cookies for %s: %s", user_id, exc)
-        return JSONResponse({"ok": False, "error": "server_error"}, status_code=500)
+        return ORJSONResponse({"ok": False, "error": "server_error"}, status_code=500)
 
     log.info("Saved cookies for user_id=%s", user_id)
 
@@ -93,4 +159,18 @@ def root():
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv("PORT", "8190"))  # Koyebなら PORT を使う
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    # nonce はプロセス内メモリで管理しているため既定は 1 ワーカー。
+    # 複数にする場合は /nonce と /riot-cookies が同じワーカーに届く構成にすること。
+    workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+    uvicorn.run(
+        # workers > 1 では各ワーカーが import し直せるよう文字列で渡す
+        "valorantBot2.rec:app" if workers > 1 else app,
+        host="0.0.0.0",
+        port=port,
+        loop="auto",  # uvloop があれば使用
+        http="auto",  # httptools があれば使用
+        workers=workers,
+        timeout_keep_alive=30,
+        limit_concurrency=1000,
+        access_log=False,
+    )
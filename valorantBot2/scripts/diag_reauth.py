@@ -1,7 +1,9 @@
 from __future__ import annotations
-import os, re, json, logging
+import os, re, json, logging, threading
 from typing import Optional, Dict, Tuple, List
+from functools import lru_cache
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import requests
 from requests.adapters import HTTPAdapter, Retry
@@ -28,6 +30,15 @@ DEFAULT_UA = ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
               "AppleWebKit/537.36 (KHTML, like Gecko) "
               "Chrome/120.0.0.0 Safari/537.36")
 
+_BASE_ADAPTER = HTTPAdapter(
+    max_retries=Retry(
+        # 403 は SSID 切れ/Cloudflare で再試行しても通らないので即返す
+        total=1, backoff_factor=0.2, status_forcelist=(409,429,500,502,503,504),
+        raise_on_status=False,
+    ),
+    pool_connections=4, pool_maxsize=16,
+)
+
 def _new_session(ua: Optional[str]) -> requests.Session:
     s = requests.Session()
     s.headers.update({
@@ -36,13 +47,17 @@ def _new_session(ua: Optional[str]) -> requests.Session:
         "Origin":"https://playvalorant.com",
         "Referer":"https://playvalorant.com/opt_in",
     })
-    s.mount("https://", HTTPAdapter(max_retries=Retry(
-        total=1, backoff_factor=0.2, status_forcelist=(403,409,429,500,502,503,504)
-    )))
+    # 接続プールは全行で共有する（Cookie/UA は Session 側なので行ごとに独立したまま）
+    s.mount("https://", _BASE_ADAPTER)
     return s
 
+_TOKEN_RE = {
+    "access_token": re.compile(r"access_token=([^&]+)"),
+    "id_token": re.compile(r"id_token=([^&]+)"),
+}
+
 def _extract(uri: str, key: str) -> Optional[str]:
-    m = re.search(rf"{re.escape(key)}=([^&]+)", uri)
+    m = _TOKEN_RE[key].search(uri)
     return m.group(1) if m else None
 
 def _mask(v: Optional[str]) -> str:
@@ -84,6 +99,8 @@ def _try(params, s) -> Tuple[int,int,bool]:
     else:
         return r.status_code, -1, ok
 
+_KEYS = tuple((k, k.upper()) for k in ("ssid","clid","sub","csid","tdid","puuid","user_agent","ua"))
+
 def _load_db(uid: str) -> Dict[str,str]:
     cookies, ua = None, None
     if _get_meta:
@@ -94,36 +111,37 @@ def _load_db(uid: str) -> Dict[str,str]:
     if cookies is None:
         from valorantBot2.services.cookiesDB import get_cookies as _gc
         cookies = _gc(uid)
-    out = {k.lower(): (cookies.get(k) or cookies.get(k.upper()) or "") for k in ("ssid","clid","sub","csid","tdid","puuid","user_agent","ua")}
+    out = {k: (cookies.get(k) or cookies.get(K) or "") for k, K in _KEYS}
     if not out.get("user_agent"): out["user_agent"] = out.get("ua") or ""
     return out
 
-def _candidate_paths(uid: str) -> List[Path]:
+def _base_dirs() -> Tuple[Path, ...]:
     here = Path(__file__).resolve()
-    paths = [
-        here.parents[1]/"services"/"cookies"/f"{uid}.txt",
-        here.parents[2]/"cookies"/f"{uid}.txt",
-        Path.cwd()/ "cookies"/f"{uid}.txt",
+    dirs = [
+        here.parents[1]/"services"/"cookies",
+        here.parents[2]/"cookies",
+        Path.cwd()/"cookies",
     ]
     envdir = os.getenv("VALORANT_COOKIES_DIR")
-    if envdir: paths.insert(0, Path(envdir)/f"{uid}.txt")
-    # dedupe
-    seen, uniq = set(), []
-    for p in paths:
-        if p not in seen:
-            uniq.append(p); seen.add(p)
-    return uniq
+    if envdir: dirs.insert(0, Path(envdir))
+    # dedupe（順序は維持）
+    return tuple(dict.fromkeys(dirs))
+
+_BASE_DIRS = _base_dirs()
+
+@lru_cache(maxsize=1024)
+def _candidate_paths(uid: str) -> Tuple[Path, ...]:
+    name = f"{uid}.txt"
+    return tuple(d/name for d in _BASE_DIRS)
+
+# KEY=VALUE 行だけを拾う（# コメント行・空行はキーにマッチしないので自然に除外される）
+_KV_RE = re.compile(rb"(?m)^[ \t]*([A-Z_][A-Z0-9_]*)[ \t]*=[ \t]*(.*?)[ \t\r]*$")
 
 def _load_file(uid: str) -> Optional[Dict[str,str]]:
     for p in _candidate_paths(uid):
         try:
             if not p.exists(): continue
-            raw = {}
-            for line in p.read_text(encoding="utf-8").splitlines():
-                line = line.strip()
-                if not line or "=" not in line or line.startswith("#"): continue
-                k,v = line.split("=",1)
-                raw[k.strip()] = v.strip()
+            raw = {k.decode(): v.decode("utf-8") for k, v in _KV_RE.findall(p.read_bytes())}
             out = { "ssid":raw.get("RIOT_SSID") or raw.get("SSID") or "",
                     "clid":raw.get("RIOT_CLID") or raw.get("CLID") or "",
                     "sub": raw.get("RIOT_SUB")  or raw.get("SUB")  or "",
@@ -135,12 +153,33 @@ def _load_file(uid: str) -> Optional[Dict[str,str]]:
             continue
     return None
 
-def run(uid: str):
+Row = Tuple[str, Dict[str,str], Optional[str], bool]
+
+DIAG_WORKERS = int(os.getenv("DIAG_WORKERS", "8"))
+
+def _run_row(row: Row, stop: Optional[threading.Event] = None) -> Tuple[str, Optional[str], Optional[str], object, object, bool]:
+    # 行ごとに専用の Session を使うのでスレッド間で状態は共有しない
+    label, env, ua, ssid_only = row
+    if stop is not None and stop.is_set():
+        return label, ua, env.get("ssid"), "skipped", "skipped", False
+    s = _new_session(ua)
+    if ssid_only: _set_ssid_only(s, env.get("ssid"))
+    else:         _set_full(s, env)
+    p1, p2, ok = _try(AUTH_PARAMS_A, s)
+    if not ok and not (stop is not None and stop.is_set()):
+        p1b, p2b, ok = _try(AUTH_PARAMS_B, s)
+        p1 = f"{p1}/{p1b}"
+        p2 = f"{p2}/{p2b}"
+    if ok and stop is not None:
+        stop.set()
+    return label, ua, env.get("ssid"), p1, p2, ok
+
+def run(uid: str, first_ok: bool = False):
     db = _load_db(uid)
     file = _load_file(uid)
 
     db_user_agent = db.get("user_agent") or None
-    matrix: List[Tuple[str, Dict[str,str], Optional[str], bool]] = [
+    matrix: List[Row] = [
         ("DB + DBUA + FULL",     db, db_user_agent, False),
         ("DB + DBUA + SSID",     db, db_user_agent, True),
         ("DB + defaultUA + FULL", db, None, False),
@@ -154,23 +193,32 @@ def run(uid: str):
             ("FILE + defaultUA + SSID", file, None, True),
         ]
 
-    for label, env, ua, ssid_only in matrix:
-        s = _new_session(ua)
-        if ssid_only: _set_ssid_only(s, env.get("ssid"))
-        else:         _set_full(s, env)
-        p1, p2, ok = _try(AUTH_PARAMS_A, s)
-        if not ok:
-            p1b, p2b, ok = _try(AUTH_PARAMS_B, s)
-            p1 = f"{p1}/{p1b}"
-            p2 = f"{p2}/{p2b}"
+    def _log(label, ua, ssid, p1, p2, ok):
         log.info("%-26s | UA=%s | SSID=%s | POST=%s GET=%s | OK=%s",
-                 label, ("DB" if ua else "DEF"),
-                 (env.get("ssid")[:4]+"…"+env.get("ssid")[-4:] if env.get("ssid") else "<none>"),
-                 p1, p2, ok)
+                 label, ("DB" if ua else "DEF"), _mask(ssid), p1, p2, ok)
+
+    # 各行は独立した HTTP 往復なので並列に投げる（ログは matrix の順で出す）
+    with ThreadPoolExecutor(max_workers=max(1, min(DIAG_WORKERS, len(matrix)))) as ex:
+        if not first_ok:
+            for result in ex.map(_run_row, matrix):
+                _log(*result)
+            return
+        # --first-ok: 最初に OK になった行で打ち切り、未着手の行はキャンセルする
+        stop = threading.Event()
+        futures = [ex.submit(_run_row, row, stop) for row in matrix]
+        for fut in as_completed(futures):
+            result = fut.result()
+            if result[3] == "skipped":
+                continue
+            _log(*result)
+            if result[5]:
+                for f in futures: f.cancel()
+                break
 
 if __name__ == "__main__":
     import sys
-    if len(sys.argv)<2:
-        print("usage: python -m valorantBot2.scripts.diag_reauth <discord_user_id>", file=sys.stderr)
+    args = [a for a in sys.argv[1:] if a != "--first-ok"]
+    if not args:
+        print("usage: python -m valorantBot2.scripts.diag_reauth [--first-ok] <discord_user_id>", file=sys.stderr)
         sys.exit(1)
-    run(sys.argv[1])
+    run(args[0], first_ok="--first-ok" in sys.argv[1:])
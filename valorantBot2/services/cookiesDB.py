@@ -1,11 +1,23 @@
 import os
-import json
+import base64
 import logging
-from typing import Optional, Dict, Any
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import partial
+from typing import Callable, Iterator, Optional, Dict, Any, Tuple, TypeVar
 
+import anyio
+import msgpack
+import orjson
 import psycopg2
 from psycopg2.extras import Json
+from psycopg2.pool import ThreadedConnectionPool
 from cryptography.fernet import Fernet
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 
 # Connection string for PostgreSQL (prefer DATABASE_URL)
 DB_DSN = os.getenv("DATABASE_URL")
@@ -27,16 +39,182 @@ if not ENC_KEY:
 
 fernet = Fernet(ENC_KEY.encode())
 
+# ``user_auth_cookies.key_version`` records how each row was encoded:
+#   1: JSON in Fernet (AES-128-CBC + HMAC-SHA256, base64 token)  -- legacy rows
+#   2: JSON in AES-256-GCM, raw ``nonce(12) || ciphertext || tag``
+#   3: msgpack in AES-256-GCM, same framing as 2
+# New rows are always written as version 3; older rows stay readable.
+KEY_VERSION_FERNET = 1
+KEY_VERSION_AESGCM = 2
+KEY_VERSION_AESGCM_MSGPACK = 3
+_AEAD_NONCE_LEN = 12
 
-def _get_conn():
-    if not DB_DSN:
-        raise RuntimeError("DATABASE_URL is not set")
-    return psycopg2.connect(DB_DSN, sslmode="require")
+# Derive a separate AES-GCM key from COOKIE_ENC_KEY instead of reusing the
+# Fernet key bytes directly for a second cipher.
+_aead = AESGCM(
+    HKDF(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=None,
+        info=b"valorantBot user_auth_cookies aes-gcm v2",
+    ).derive(base64.urlsafe_b64decode(ENC_KEY.encode()))
+)
+
+
+def _encrypt(discord_user_id: str, cookies: Dict[str, str]) -> Tuple[int, bytes]:
+    """Serialize with msgpack and encrypt with AES-GCM (user id bound as AAD)."""
+    plaintext = msgpack.packb(cookies, use_bin_type=True)
+    nonce = os.urandom(_AEAD_NONCE_LEN)
+    return (
+        KEY_VERSION_AESGCM_MSGPACK,
+        nonce + _aead.encrypt(nonce, plaintext, discord_user_id.encode()),
+    )
+
+
+def _decrypt(discord_user_id: str, blob: bytes, key_version: int) -> Dict[str, str]:
+    if key_version in (KEY_VERSION_AESGCM_MSGPACK, KEY_VERSION_AESGCM):
+        plaintext = _aead.decrypt(
+            blob[:_AEAD_NONCE_LEN], blob[_AEAD_NONCE_LEN:], discord_user_id.encode()
+        )
+        if key_version == KEY_VERSION_AESGCM_MSGPACK:
+            return msgpack.unpackb(plaintext, raw=False)
+        return orjson.loads(plaintext)
+    if key_version == KEY_VERSION_FERNET:
+        return orjson.loads(fernet.decrypt(blob))
+    raise ValueError(f"Unsupported key_version {key_version} for user {discord_user_id}")
+
+
+# Connection pool size (connections are shared by the bot and the API server)
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "16"))
+
+_pool: Optional[ThreadedConnectionPool] = None
+_pool_lock = threading.Lock()
+# getconn raises PoolError when every connection is checked out; make
+# callers (bot threads, get_store's workers, the API server) wait instead.
+_pool_slots = threading.BoundedSemaphore(DB_POOL_MAX)
+
+
+def _get_pool() -> ThreadedConnectionPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                if not DB_DSN:
+                    raise RuntimeError("DATABASE_URL is not set")
+                _pool = ThreadedConnectionPool(
+                    DB_POOL_MIN,
+                    DB_POOL_MAX,
+                    DB_DSN,
+                    sslmode="require",
+                    # Detect connections silently dropped by NAT/idle timeouts
+                    keepalives=1,
+                    keepalives_idle=30,
+                    keepalives_interval=10,
+                    keepalives_count=3,
+                )
+    return _pool
+
+
+# Raised when a pooled connection has gone away (e.g. closed by the server's
+# idle timeout); such a connection must not go back into the pool.
+_DISCONNECT_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError)
+
+T = TypeVar("T")
+
+
+@contextmanager
+def _get_conn() -> Iterator["psycopg2.extensions.connection"]:
+    """Borrow a pooled connection; commit on success, roll back on error."""
+    pool = _get_pool()
+    with _pool_slots:
+        conn = pool.getconn()
+        if conn.closed:
+            # Already known dead at checkout: swap it for a fresh one
+            pool.putconn(conn, close=True)
+            conn = pool.getconn()
+        discard = False
+        try:
+            yield conn
+            conn.commit()
+        except BaseException as e:
+            discard = isinstance(e, _DISCONNECT_ERRORS)
+            if not conn.closed:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    discard = True
+            raise
+        finally:
+            # Drop dead connections instead of handing them out again
+            pool.putconn(conn, close=discard or bool(conn.closed))
+
+
+def _with_cursor(fn: Callable[["psycopg2.extensions.cursor"], T]) -> T:
+    """Run ``fn(cur)`` in one transaction, retrying once on a fresh connection
+    if the pooled one turned out to be dead before the transaction committed."""
+    committing = False
+    try:
+        with _get_conn() as conn:
+            with conn.cursor() as cur:
+                result = fn(cur)
+            committing = True  # leaving the block runs COMMIT
+        return result
+    except _DISCONNECT_ERRORS as e:
+        if committing:
+            # The server may have committed before the connection dropped;
+            # running the statements again could duplicate rows.
+            raise
+        logging.warning("DB connection lost (%s); retrying on a new connection", str(e).strip())
+    with _get_conn() as conn, conn.cursor() as cur:
+        return fn(cur)
+
+
+# Decrypted cookies are cached per user for a short time: the store/reauth
+# path reads the same row repeatedly, and each read costs a DB round trip
+# plus a decrypt.  Writes through save_cookies invalidate the entry.
+COOKIE_CACHE_TTL = float(os.getenv("COOKIE_CACHE_TTL", "60"))  # seconds
+COOKIE_CACHE_MAX = 1024
+
+_cookie_cache: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+_cookie_cache_lock = threading.Lock()
+_cookie_cache_gen = 0  # bumped on every invalidation
+
+
+def _cache_get(discord_user_id: str) -> Optional[Dict[str, Any]]:
+    with _cookie_cache_lock:
+        hit = _cookie_cache.get(discord_user_id)
+        if hit is None:
+            return None
+        if hit[0] < time.monotonic():
+            del _cookie_cache[discord_user_id]
+            return None
+        _cookie_cache.move_to_end(discord_user_id)
+        return hit[1]
+
+
+def _cache_put(discord_user_id: str, meta: Dict[str, Any], gen: int) -> None:
+    with _cookie_cache_lock:
+        # A save_cookies that ran while we were reading makes our row stale
+        if gen != _cookie_cache_gen:
+            return
+        _cookie_cache[discord_user_id] = (time.monotonic() + COOKIE_CACHE_TTL, meta)
+        _cookie_cache.move_to_end(discord_user_id)
+        while len(_cookie_cache) > COOKIE_CACHE_MAX:
+            _cookie_cache.popitem(last=False)
+
+
+def _cache_invalidate(discord_user_id: str) -> None:
+    global _cookie_cache_gen
+    with _cookie_cache_lock:
+        _cookie_cache_gen += 1
+        _cookie_cache.pop(discord_user_id, None)
 
 
 def init_db() -> None:
     """Create tables if they don't exist."""
-    with _get_conn() as conn, conn.cursor() as cur:
+
+    def _create(cur: "psycopg2.extensions.cursor") -> None:
         cur.execute(
             """
             CREATE TABLE IF NOT EXISTS user_auth_cookies (
@@ -67,6 +245,8 @@ def init_db() -> None:
             "CREATE INDEX IF NOT EXISTS auth_cookie_history_idx ON auth_cookie_history (discord_user_id, created_at DESC)"
         )
 
+    _with_cursor(_create)
+
 
 def save_cookies(
     discord_user_id: str,
@@ -79,44 +259,46 @@ def save_cookies(
     # Always store as TEXT to avoid bigint comparisons in SQL
     discord_user_id = str(discord_user_id)
 
-    encoded = json.dumps(cookies).encode()
-    encrypted = fernet.encrypt(encoded)
-    with _get_conn() as conn, conn.cursor() as cur:
+    key_version, encrypted = _encrypt(discord_user_id, cookies)
+
+    def _upsert(cur: "psycopg2.extensions.cursor") -> None:
+        # UPSERT と履歴追記を 1 ステートメント（1 往復）で行う
         cur.execute(
             """
-            INSERT INTO user_auth_cookies (
-              discord_user_id, encrypted_cookies, user_agent, last_ip
-            ) VALUES (%s, %s, %s, %s)
-            ON CONFLICT (discord_user_id) DO UPDATE SET
-              encrypted_cookies = EXCLUDED.encrypted_cookies,
-              user_agent = EXCLUDED.user_agent,
-              last_ip = EXCLUDED.last_ip,
-              updated_at = NOW()
-            ;
+            WITH up AS (
+              INSERT INTO user_auth_cookies (
+                discord_user_id, encrypted_cookies, key_version, user_agent, last_ip
+              ) VALUES (%s, %s, %s, %s, %s)
+              ON CONFLICT (discord_user_id) DO UPDATE SET
+                encrypted_cookies = EXCLUDED.encrypted_cookies,
+                key_version = EXCLUDED.key_version,
+                user_agent = EXCLUDED.user_agent,
+                last_ip = EXCLUDED.last_ip,
+                updated_at = NOW()
+              RETURNING discord_user_id
+            )
+            INSERT INTO auth_cookie_history (discord_user_id, event, meta)
+            SELECT discord_user_id, %s, %s FROM up;
             """,
-            (discord_user_id, psycopg2.Binary(encrypted), user_agent, last_ip),
-        )
-        cur.execute(
-            """INSERT INTO auth_cookie_history (discord_user_id, event, meta) VALUES (%s, %s, %s);""",
-            (discord_user_id, "saved", Json(cookies)),
+            (
+                discord_user_id,
+                psycopg2.Binary(encrypted),
+                key_version,
+                user_agent,
+                last_ip,
+                "saved",
+                Json(cookies),
+            ),
         )
 
+    _with_cursor(_upsert)
+    _cache_invalidate(discord_user_id)
+
 
 def get_cookies(discord_user_id: str) -> Optional[Dict[str, str]]:
     """Retrieve and decrypt cookies for a Discord user."""
-    discord_user_id = str(discord_user_id)
-
-    with _get_conn() as conn, conn.cursor() as cur:
-        cur.execute(
-            "SELECT encrypted_cookies FROM user_auth_cookies WHERE discord_user_id = %s AND is_active",
-            (discord_user_id,),
-        )
-        row = cur.fetchone()
-        if not row:
-            return None
-        encrypted = bytes(row[0])
-        decoded = fernet.decrypt(encrypted)
-        return json.loads(decoded.decode())
+    meta = get_cookies_and_meta(discord_user_id)
+    return meta["cookies"] if meta else None
 
 
 def get_cookies_and_meta(discord_user_id: str) -> Optional[Dict[str, Any]]:
@@ -126,16 +308,55 @@ def get_cookies_and_meta(discord_user_id: str) -> Optional[Dict[str, Any]]:
     """
     discord_user_id = str(discord_user_id)
 
-    with _get_conn() as conn, conn.cursor() as cur:
+    cached = _cache_get(discord_user_id)
+    if cached is not None:
+        # Hand out copies so callers cannot mutate the cached entry
+        return {"cookies": dict(cached["cookies"]), "user_agent": cached["user_agent"]}
+
+    gen = _cookie_cache_gen
+
+    def _select(cur: "psycopg2.extensions.cursor") -> Optional[Tuple[Any, ...]]:
         cur.execute(
-            "SELECT encrypted_cookies, user_agent FROM user_auth_cookies WHERE discord_user_id = %s AND is_active",
+            "SELECT encrypted_cookies, user_agent, key_version FROM user_auth_cookies"
+            " WHERE discord_user_id = %s AND is_active",
             (discord_user_id,),
         )
-        row = cur.fetchone()
-        if not row:
-            return None
-        encrypted = bytes(row[0])
-        decoded = fernet.decrypt(encrypted)
-        cookies: Dict[str, str] = json.loads(decoded.decode())
-        user_agent: Optional[str] = row[1]
-        return {"cookies": cookies, "user_agent": user_agent}
+        return cur.fetchone()
+
+    row = _with_cursor(_select)
+    if not row:
+        return None
+    encrypted = bytes(row[0])
+    cookies: Dict[str, str] = _decrypt(discord_user_id, encrypted, row[2])
+    user_agent: Optional[str] = row[1]
+    _cache_put(discord_user_id, {"cookies": cookies, "user_agent": user_agent}, gen)
+    return {"cookies": dict(cookies), "user_agent": user_agent}
+
+
+# Async wrapper for event-loop callers (the FastAPI endpoints).
+# The blocking call runs in anyio's worker threads behind a limiter sized to
+# the connection pool, so a burst of requests queues on the loop side instead
+# of parking worker threads on _pool_slots.
+_db_limiter: Optional[anyio.CapacityLimiter] = None
+
+
+def _get_limiter() -> anyio.CapacityLimiter:
+    # Created lazily: CapacityLimiter needs a running event loop
+    global _db_limiter
+    if _db_limiter is None:
+        _db_limiter = anyio.CapacityLimiter(DB_POOL_MAX)
+    return _db_limiter
+
+
+async def asave_cookies(
+    discord_user_id: str,
+    cookies: Dict[str, str],
+    *,
+    user_agent: Optional[str] = None,
+    last_ip: Optional[str] = None,
+) -> None:
+    """Async variant of :func:`save_cookies`."""
+    await anyio.to_thread.run_sync(
+        partial(save_cookies, discord_user_id, cookies, user_agent=user_agent, last_ip=last_ip),
+        limiter=_get_limiter(),
+    )
@@ -12,15 +12,22 @@ Valorant storefront fetcher with auto PUUID discovery and very-robust Riot reaut
 
 from __future__ import annotations
 
-import base64
-import json
 import logging
 import os
-import re
+import random
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import lru_cache
+from itertools import chain
 from pathlib import Path
-from typing import Any, Dict, Optional, Tuple, List
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, NamedTuple, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
 
+import orjson
 import requests
 from requests.adapters import HTTPAdapter, Retry
 
@@ -32,6 +39,20 @@ class ReauthExpired(RuntimeError):
     """Raised when Riot reauth flow fails to yield tokens."""
 
 
+@dataclass(slots=True)
+class RiotCreds:
+    """保存済み Riot cookie（と保存時の UA）。DB/ファイルどちらから読んでもこの形にそろえる。"""
+
+    # cookie 値は repr（ログ/例外メッセージ）に出さない
+    ssid: Optional[str] = field(default=None, repr=False)
+    puuid: Optional[str] = None
+    clid: Optional[str] = field(default=None, repr=False)
+    sub: Optional[str] = field(default=None, repr=False)
+    csid: Optional[str] = field(default=None, repr=False)
+    tdid: Optional[str] = field(default=None, repr=False)
+    user_agent: Optional[str] = None
+
+
 # ---- DB cookie loader（UA付きがあれば優先）----
 try:
     from .cookiesDB import get_cookies_and_meta as _db_get_cookies_and_meta
@@ -82,34 +103,105 @@ DEFAULT_HEADERS = {
     "Accept-Language": "ja,en-US;q=0.9,en;q=0.8",
 }
 
+# ディスクキャッシュ置き場（スキン一覧・storefront の版など、再起動をまたいで使うもの）
+CACHE_DIR = Path(os.getenv("VALORANT_CACHE_DIR") or (Path.home() / ".cache" / "valorantbot"))
+
 # VP currency UUID / ItemType
 VP_ID = "85ad13f7-3d1b-5128-9eb2-7cd8ee0b5741"
 ITEMTYPE_WEAPON_SKIN = "e7c63390-eda7-46e0-bb7a-a6abdacd2433"
 
 
 # ---------------- Session / Retry ----------------
-def _new_session(user_agent: Optional[str] = None) -> requests.Session:
+BACKOFF_CAP = 5.0  # seconds
+RETRY_AFTER_CAP = 5.0  # seconds。Riot の 429 は Retry-After が長いことがあり、/store の応答が分単位で止まるのを防ぐ
+RETRY_METHODS = frozenset({"GET", "POST", "PUT"})
+
+
+class _JitterRetry(Retry):
+    """
+    指数バックオフを full jitter（0〜上限の一様乱数）にした Retry。
+    固定間隔だと同時に弾かれたリクエストが同じタイミングで再送して再び 429 になりやすい。
+    Retry-After が付いた 429/503 はヘッダの値を優先するが、RETRY_AFTER_CAP で頭打ちにする。
+    """
+
+    def get_backoff_time(self) -> float:
+        base = min(BACKOFF_CAP, super().get_backoff_time())
+        return random.uniform(0, base) if base > 0 else 0
+
+    def get_retry_after(self, response: Any) -> Optional[float]:
+        retry_after = super().get_retry_after(response)
+        return None if retry_after is None else min(RETRY_AFTER_CAP, retry_after)
+
+
+def _new_adapter(
+    pool_maxsize: int = 10,
+    *,
+    total: int = 3,
+    backoff_factor: float = 0.5,
+    # Do not retry on 403 (Cloudflare challenge) to avoid RetryError
+    status_forcelist: Tuple[int, ...] = (409, 429, 500, 502, 503, 504),
+) -> HTTPAdapter:
+    retry = _JitterRetry(
+        total=total,
+        backoff_factor=backoff_factor,
+        status_forcelist=status_forcelist,
+        allowed_methods=RETRY_METHODS,
+        raise_on_status=False,
+    )
+    return HTTPAdapter(max_retries=retry, pool_connections=8, pool_maxsize=pool_maxsize)
+
+
+# Riot 側は Cookie Jar がユーザーごとなので Session は呼び出しごとに作るが、
+# 接続プールは Adapter 側にあるので全 Session で共有して TCP/TLS を使い回す。
+# （これらの Adapter を mount した Session は close しないこと。共有プールごと閉じてしまう）
+# 認証系（auth / entitlements）は 401/403/409 が Cookie 不良を意味するので再試行は 1 回・一時エラーのみ。
+RIOT_AUTH_PREFIXES = ("https://auth.riotgames.com", "https://entitlements.auth.riotgames.com")
+_RIOT_AUTH_ADAPTER = _new_adapter(
+    pool_maxsize=16, total=1, backoff_factor=0.3, status_forcelist=(429, 500, 502, 503, 504)
+)
+_RIOT_API_ADAPTER = _new_adapter(pool_maxsize=32)  # PAS / pd.*.a.pvp.net
+
+
+def _new_session(user_agent: Optional[str] = None, *, adapter: Optional[HTTPAdapter] = None) -> requests.Session:
     s = requests.Session()
     headers = DEFAULT_HEADERS.copy()
     if user_agent:
         headers["User-Agent"] = user_agent
     s.headers.update(headers)
-    retry = Retry(
-        total=3,
-        backoff_factor=0.5,
-        # Do not retry on 403 (Cloudflare challenge) to avoid RetryError
-        status_forcelist=(409, 429, 500, 502, 503, 504),
-        allowed_methods={"GET", "POST", "PUT"},
-        raise_on_status=False,
-    )
-    s.mount("https://", HTTPAdapter(max_retries=retry))
+    s.mount("https://", adapter or _new_adapter())
+    return s
+
+
+def _new_riot_session(user_agent: Optional[str] = None) -> requests.Session:
+    # mount はプレフィックスの長い順に照合されるので、認証ホストだけ _RIOT_AUTH_ADAPTER になる
+    s = _new_session(user_agent, adapter=_RIOT_API_ADAPTER)
+    for prefix in RIOT_AUTH_PREFIXES:
+        s.mount(prefix, _RIOT_AUTH_ADAPTER)
     return s
 
 
+# valorant-api.com は Cookie 不要・全ユーザー共通なので 1 つの Session（keep-alive）を使い回す。
+_VALAPI_SESSION = _new_session(adapter=_new_adapter(pool_maxsize=32))
+
+# 独立した HTTP 呼び出しの並列化用。呼び出しごとに executor を作らず、スレッドを使い回す。
+# （ここに投げたタスクの中から更に投げて待つことはしない＝プールが詰まってもデッドロックしない）
+IO_POOL_WORKERS = 16
+_IO_POOL = ThreadPoolExecutor(max_workers=IO_POOL_WORKERS, thread_name_prefix="valorant-io")
+
+
 # ---------------- Helpers ----------------
-def _extract_from_uri(uri: str, key: str) -> Optional[str]:
-    m = re.search(rf"{re.escape(key)}=([^&]+)", uri)
-    return m.group(1) if m else None
+def _json(r: requests.Response) -> Any:
+    # Response.json() は標準 json + text デコードを経由するので、bytes を orjson で直接読む
+    return orjson.loads(r.content)
+
+
+def _tokens_from_uri(uri: str) -> Tuple[Optional[str], Optional[str]]:
+    """redirect URI の fragment（無ければ query）から (access_token, id_token) を 1 回のパースで取り出す。"""
+    parts = urlparse(uri)
+    qs = parse_qs(parts.fragment or parts.query)
+    at = qs.get("access_token")
+    it = qs.get("id_token")
+    return (at[0] if at else None), (it[0] if it else None)
 
 
 def _sanitize(v: Optional[str]) -> Optional[str]:
@@ -129,7 +221,7 @@ def _mask(v: Optional[str]) -> str:
     return v[0:4] + "…" + v[-4:]
 
 
-def _load_env_from_db(discord_user_id: str) -> Dict[str, Optional[str]]:
+def _load_env_from_db(discord_user_id: str) -> RiotCreds:
     cookies: Optional[Dict[str, str]] = None
     ua: Optional[str] = None
 
@@ -143,20 +235,20 @@ def _load_env_from_db(discord_user_id: str) -> Dict[str, Optional[str]]:
     if not cookies:
         raise ValueError(f"No cookies stored for Discord user {discord_user_id}")
 
-    env = {
-        "ssid": _sanitize(cookies.get("ssid") or cookies.get("RIOT_SSID")),
-        "puuid": _sanitize(cookies.get("puuid") or cookies.get("RIOT_PUUID")),
-        "clid": _sanitize(cookies.get("clid") or cookies.get("RIOT_CLID")),
-        "sub": _sanitize(cookies.get("sub") or cookies.get("RIOT_SUB")),
-        "csid": _sanitize(cookies.get("csid") or cookies.get("RIOT_CSID")),
-        "tdid": _sanitize(cookies.get("tdid") or cookies.get("RIOT_TDID")),
-        "user_agent": _sanitize(ua) or _sanitize(cookies.get("user_agent") or cookies.get("ua")),
-    }
+    env = RiotCreds(
+        ssid=_sanitize(cookies.get("ssid") or cookies.get("RIOT_SSID")),
+        puuid=_sanitize(cookies.get("puuid") or cookies.get("RIOT_PUUID")),
+        clid=_sanitize(cookies.get("clid") or cookies.get("RIOT_CLID")),
+        sub=_sanitize(cookies.get("sub") or cookies.get("RIOT_SUB")),
+        csid=_sanitize(cookies.get("csid") or cookies.get("RIOT_CSID")),
+        tdid=_sanitize(cookies.get("tdid") or cookies.get("RIOT_TDID")),
+        user_agent=_sanitize(ua) or _sanitize(cookies.get("user_agent") or cookies.get("ua")),
+    )
     log.debug(
         "DB cookies loaded: ssid=%s, puuid=%s, ua=%s",
-        _mask(env["ssid"]),
-        _mask(env["puuid"]),
-        _mask(env["user_agent"]),
+        _mask(env.ssid),
+        _mask(env.puuid),
+        _mask(env.user_agent),
     )
     return env
 
@@ -188,35 +280,34 @@ def _candidate_cookie_paths(discord_user_id: str) -> List[Path]:
     return uniq
 
 
-def _load_env_from_file(discord_user_id: str) -> Dict[str, Optional[str]]:
+def _load_env_from_file(discord_user_id: str) -> RiotCreds:
     last_err: Optional[Exception] = None
     for p in _candidate_cookie_paths(discord_user_id):
         try:
             if not p.exists():
                 continue
-            raw: Dict[str, str] = {}
-            with p.open("r", encoding="utf-8") as f:
-                for line in f:
-                    line = line.strip()
-                    if not line or line.startswith("#"):
-                        continue
-                    if "=" in line:
-                        k, v = line.split("=", 1)
-                        raw[k.strip()] = v.strip()
-            env = {
-                "ssid": _sanitize(raw.get("RIOT_SSID") or raw.get("SSID")),
-                "puuid": _sanitize(raw.get("RIOT_PUUID") or raw.get("PUUID")),
-                "clid": _sanitize(raw.get("RIOT_CLID") or raw.get("CLID")),
-                "sub": _sanitize(raw.get("RIOT_SUB") or raw.get("SUB")),
-                "csid": _sanitize(raw.get("RIOT_CSID") or raw.get("CSID")),
-                "tdid": _sanitize(raw.get("RIOT_TDID") or raw.get("TDID")),
-                "user_agent": None,
+            # KEY=VALUE 形式。一度に読み、partition で分割する（空行・# コメント・= の無い行は無視）
+            raw: Dict[str, str] = {
+                k.strip(): v.strip()
+                for k, sep, v in (
+                    line.partition("=") for line in p.read_text(encoding="utf-8").splitlines()
+                    if line.strip() and not line.lstrip().startswith("#")
+                )
+                if sep
             }
+            env = RiotCreds(
+                ssid=_sanitize(raw.get("RIOT_SSID") or raw.get("SSID")),
+                puuid=_sanitize(raw.get("RIOT_PUUID") or raw.get("PUUID")),
+                clid=_sanitize(raw.get("RIOT_CLID") or raw.get("CLID")),
+                sub=_sanitize(raw.get("RIOT_SUB") or raw.get("SUB")),
+                csid=_sanitize(raw.get("RIOT_CSID") or raw.get("CSID")),
+                tdid=_sanitize(raw.get("RIOT_TDID") or raw.get("TDID")),
+            )
             log.debug(
                 "File cookies loaded from %s: ssid=%s, puuid=%s",
                 str(p),
-                _mask(env["ssid"]),
-                _mask(env["puuid"]),
+                _mask(env.ssid),
+                _mask(env.puuid),
             )
             return env
         except Exception as e:
@@ -227,82 +318,73 @@ def _load_env_from_file(discord_user_id: str) -> Dict[str, Optional[str]]:
     raise FileNotFoundError("No cookie file found in any candidate path.")
 
 
-def _set_only_ssid(session: requests.Session, ssid: Optional[str]) -> None:
-    """まずは SSID のみを Jar に積む（余計な cookie が 403 を誘発するケースの切り分け）"""
+def _set_full_cookies(session: requests.Session, env: RiotCreds) -> None:
+    """SSID + CLID/SUB/CSID/TDID を Jar に積む（.riotgames.com に 1 回ずつ。auth.riotgames.com にも送られる）"""
+    jar = requests.cookies.RequestsCookieJar()
+    for k in ("ssid", "clid", "sub", "csid", "tdid"):
+        v = getattr(env, k)
+        if v:
+            jar.set(k, v, domain=".riotgames.com", path="/")
     session.cookies.clear()
-    if not ssid:
-        return
-    for domain in (".riotgames.com", "auth.riotgames.com"):
-        session.cookies.set("ssid", ssid, domain=domain)
+    session.cookies.update(jar)
 
 
-def _set_full_cookies(session: requests.Session, env: Dict[str, Optional[str]]) -> None:
-    """SSID + CLID/SUB/CSID/TDID を Jar に積む（path は指定しない＝単体スクリプト準拠）"""
-    session.cookies.clear()
+def _is_cloudflare_block(text: str) -> bool:
+    return "Attention Required! | Cloudflare" in text or "cf-browser-verification" in text
 
-    def _set(k: str, v: Optional[str]) -> None:
-        if not v:
-            return
-        for d in (".riotgames.com", "auth.riotgames.com"):
-            session.cookies.set(k, v, domain=d)
 
-    _set("ssid", env.get("ssid"))
-    for k in ("clid", "sub", "csid", "tdid"):
-        _set(k, env.get(k))
+def _try_params(session: requests.Session, params: Dict[str, Any]) -> Tuple[Optional[Tuple[str, str]], str, bool]:
+    """
+    1 組の params で POST → (失敗時のみ) GET を試す。
+    戻り値: ((access_token, id_token) or None, 最後のデバッグ文字列, login_required を見たか)
+    デバッグ文字列（本文のデコード）は両方失敗したときだけ作る。
+    """
+    r = session.post(AUTH_URL_LEGACY, json=params, timeout=TIMEOUT)
+    log.debug("reauth POST scope=%s -> %s", params.get("scope"), r.status_code)
+    if r.ok:
+        try:
+            uri = _json(r).get("response", {}).get("parameters", {}).get("uri")
+        except Exception:
+            uri = None
+        if uri:
+            at, it = _tokens_from_uri(uri)
+            if at and it:
+                return (at, it), "", False
+    login_required = b"login_required" in r.content
+
+    r2 = session.get(AUTH_URL_V2, params=params, allow_redirects=False, timeout=TIMEOUT)
+    log.debug("reauth GET  scope=%s -> %s", params.get("scope"), r2.status_code)
+    if r2.status_code in (301, 302, 303, 307, 308):
+        loc = r2.headers.get("Location") or r2.headers.get("location")
+        if loc:
+            at, it = _tokens_from_uri(loc)
+            if at and it:
+                return (at, it), "", False
+            return None, loc, login_required or "login_required" in loc
+    elif r2.content:
+        try:
+            text_snippet = r2.text[:500]
+        except Exception:
+            text_snippet = "<no response text>"
+        return None, text_snippet, login_required or "login_required" in text_snippet
+    try:
+        last_dbg = r.text[:500]
+    except Exception:
+        last_dbg = "<no response text>"
+    return None, last_dbg, login_required
 
 
 def _reauth_get_tokens(session: requests.Session) -> Tuple[str, str]:
-    import logging
-
-    log = logging.getLogger(__name__)
-    last_dbg = "<no response>"
-    login_required = False
-    for params in (AUTH_PARAMS_A, AUTH_PARAMS_B):
-        r = session.post(AUTH_URL_LEGACY, json=params, timeout=TIMEOUT)
-        log.debug("reauth POST scope=%s -> %s", params.get("scope"), r.status_code)
-        if r.ok:
-            try:
-                data = r.json()
-                uri = data.get("response", {}).get("parameters", {}).get("uri")
-                if uri:
-                    at = _extract_from_uri(uri, "access_token")
-                    it = _extract_from_uri(uri, "id_token")
-                    if at and it:
-                        return at, it
-            except Exception:
-                pass
-        try:
-            last_dbg = r.text[:500]
-        except Exception:
-            last_dbg = "<no response text>"
-        if isinstance(last_dbg, str) and "login_required" in last_dbg:
-            login_required = True
-
-        r2 = session.get(AUTH_URL_V2, params=params, allow_redirects=False, timeout=TIMEOUT)
-        log.debug("reauth GET  scope=%s -> %s", params.get("scope"), r2.status_code)
-        if r2.status_code in (301, 302, 303, 307, 308):
-            loc = r2.headers.get("Location") or r2.headers.get("location")
-            if loc:
-                if "login_required" in loc:
-                    login_required = True
-                at = _extract_from_uri(loc, "access_token")
-                it = _extract_from_uri(loc, "id_token")
-                if at and it:
-                    return at, it
-                last_dbg = loc
-        else:
-            try:
-                text_snippet = r2.text[:500]
-            except Exception:
-                text_snippet = "<no response text>"
-            if "login_required" in text_snippet:
-                login_required = True
-            if text_snippet:
-                last_dbg = text_snippet
+    tokens, last_dbg, login_required = _try_params(session, AUTH_PARAMS_A)
+    if tokens:
+        return tokens
+    # login_required / Cloudflare は scope を変えても通らないので B は試さない（スコープ起因の失敗だけ B へ）
+    if not login_required and not _is_cloudflare_block(last_dbg):
+        tokens, last_dbg, login_required = _try_params(session, AUTH_PARAMS_B)
+        if tokens:
+            return tokens
     # Cloudflare 文言検知でメッセージを差し替え
-    if isinstance(last_dbg, str) and (
-        "Attention Required! | Cloudflare" in last_dbg or "cf-browser-verification" in last_dbg
-    ):
+    if _is_cloudflare_block(last_dbg):
         raise ReauthExpired(
             "Reauth blocked by Cloudflare (403). Please change egress IP or use a trusted proxy."
         )
@@ -313,15 +395,15 @@ def _reauth_get_tokens(session: requests.Session) -> Tuple[str, str]:
     raise ReauthExpired(f"Reauth failed: tokens not found (dbg={last_dbg!r})")
 
 
-def _get_entitlements_token(session: requests.Session, access_token: str) -> str:
+def _get_entitlements_token(session: requests.Session, auth: Dict[str, str]) -> str:
     r = session.post(
         ENTITLEMENTS_URL,
-        headers={"Authorization": f"Bearer {access_token}"},
+        headers=auth,
         json={},
         timeout=TIMEOUT,
     )
     r.raise_for_status()
-    data = r.json()
+    data = _json(r)
     # 両対応
     token = data.get("entitlements_token") or data.get("token")
     if not token:
@@ -329,17 +411,17 @@ def _get_entitlements_token(session: requests.Session, access_token: str) -> str
     return token
 
 
-def _get_shard(session: requests.Session, access_token: str, id_token: str) -> str:
+def _get_shard(session: requests.Session, auth: Dict[str, str], id_token: str) -> str:
     r = session.put(
         PAS_URL,
-        headers={"Authorization": f"Bearer {access_token}"},
+        headers=auth,
         json={"id_token": id_token},
         timeout=TIMEOUT,
     )
     if r.status_code == 400:
         raise RuntimeError(f"PAS 400 Bad Request（id_token/Authorization を確認）: {r.text[:300]}")
     r.raise_for_status()
-    data = r.json()
+    data = _json(r)
     try:
         shard = data["affinities"]["live"]
     except KeyError:
@@ -349,37 +431,55 @@ def _get_shard(session: requests.Session, access_token: str, id_token: str) -> s
     return shard
 
 
-def _get_puuid(session: requests.Session, access_token: str) -> str:
+def _get_puuid(session: requests.Session, auth: Dict[str, str]) -> str:
     # ★ GET を推奨（POSTから変更）
     r = session.get(
         USERINFO_URL,
-        headers={"Authorization": f"Bearer {access_token}"},
+        headers=auth,
         timeout=TIMEOUT,
     )
     r.raise_for_status()
-    data = r.json()
+    data = _json(r)
     puuid = data.get("sub")
     if not puuid:
         raise RuntimeError(f"PUUID (sub) not found in userinfo: {data!r}")
     return puuid
 
 
-def _build_client_platform_b64() -> str:
-    payload = {
-        "platformType": "PC",
-        "platformOS": "Windows",
-        "platformOSVersion": "10.0.19042.1.256.64bit",
-        "platformChipset": "Unknown",
-    }
-    js = json.dumps(payload, separators=(",", ":")).encode()
-    return base64.b64encode(js).decode()
+# X-Riot-ClientPlatform: 以下の固定 JSON（空白なし）の base64
+#   {"platformType":"PC","platformOS":"Windows","platformOSVersion":"10.0.19042.1.256.64bit","platformChipset":"Unknown"}
+CLIENT_PLATFORM_B64 = (
+    "eyJwbGF0Zm9ybVR5cGUiOiJQQyIsInBsYXRmb3JtT1MiOiJXaW5kb3dzIiwicGxhdGZvcm1PU1ZlcnNpb24iOiIx"
+    "MC4wLjE5MDQyLjEuMjU2LjY0Yml0IiwicGxhdGZvcm1DaGlwc2V0IjoiVW5rbm93biJ9"
+)
+
+
+# client version はパッチ単位（数週間）でしか変わらないので 1 時間使い回す
+CLIENT_VERSION_TTL = 3600.0  # seconds
+_client_version: Optional[Tuple[float, str]] = None  # (expires_at, version)
+# 期限切れ時に同時に来た呼び出しは 1 本の取得にまとめる（single-flight）
+_client_version_lock = threading.Lock()
 
 
 def _get_client_version(session: requests.Session) -> str:
+    global _client_version
+    cached = _client_version
+    if cached is not None and cached[0] > time.monotonic():
+        return cached[1]
+    with _client_version_lock:
+        cached = _client_version
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1]
+        ver = _fetch_client_version(session)
+        _client_version = (time.monotonic() + CLIENT_VERSION_TTL, ver)
+        return ver
+
+
+def _fetch_client_version(session: requests.Session) -> str:
     # valorant-api の version エンドポイントを使用（取得失敗/空は落とす）
     r = session.get(f"{VALAPI_BASE}/v1/version", timeout=TIMEOUT)
     r.raise_for_status()
-    data = r.json().get("data", {}) or {}
+    data = _json(r).get("data", {}) or {}
     ver = data.get("riotClientVersion") or data.get("riotClientBuild") or data.get("version") or ""
     ver = (ver or "").strip()
     if not ver:
@@ -388,6 +488,21 @@ def _get_client_version(session: requests.Session) -> str:
 
 
 # ---- storefront helpers ----
+@lru_cache(maxsize=256)
+def _pd_headers(access: str, ent: str, ver: str) -> Tuple[Dict[str, str], Dict[str, str]]:
+    """
+    PD 用ヘッダ（GET 用 / JSON POST 用）。(トークン, バージョン) ごとにキャッシュして同じ dict を使い回す。
+    共有されるので呼び出し側で書き換えないこと（requests は渡した dict を変更しない）。
+    """
+    headers = {
+        "Authorization": f"Bearer {access}",
+        "X-Riot-Entitlements-JWT": ent,
+        "X-Riot-ClientVersion": ver,
+        "X-Riot-ClientPlatform": CLIENT_PLATFORM_B64,
+    }
+    return headers, {**headers, "Content-Type": "application/json"}
+
+
 def _pd_get(session: requests.Session, url: str, headers: Dict[str, str]) -> requests.Response:
     # PD GET（v2 用）
     return session.get(url, headers=headers, timeout=TIMEOUT, allow_redirects=True)
@@ -399,10 +514,10 @@ def _pd_post(
     headers: Dict[str, str],
     json_body: dict | None = None,
 ) -> requests.Response:
-    # PD POST（v3 用）
+    # PD POST（v3 用）。headers は Content-Type: application/json 込みで渡す
     return session.post(
         url,
-        headers={**headers, "Content-Type": "application/json"},
+        headers=headers,
         json=json_body or {},
         timeout=TIMEOUT,
         allow_redirects=True,
@@ -413,18 +528,9 @@ def _get_storefront_v2(
     session: requests.Session,
     shard: str,
     puuid: str,
-    access: str,
-    ent: str,
-    ver: str,
-    plat_b64: str,
+    headers: Dict[str, str],
 ) -> requests.Response:
     url = STOREFRONT_V2_URL.format(shard=shard, puuid=puuid)
-    headers = {
-        "Authorization": f"Bearer {access}",
-        "X-Riot-Entitlements-JWT": ent,
-        "X-Riot-ClientVersion": ver,
-        "X-Riot-ClientPlatform": plat_b64,
-    }
     return _pd_get(session, url, headers)
 
 
@@ -432,20 +538,101 @@ def _get_storefront_v3(
     session: requests.Session,
     shard: str,
     puuid: str,
-    access: str,
-    ent: str,
-    ver: str,
-    plat_b64: str,
+    json_headers: Dict[str, str],
 ) -> requests.Response:
     url = STOREFRONT_V3_URL.format(shard=shard, puuid=puuid)
-    headers = {
-        "Authorization": f"Bearer {access}",
-        "X-Riot-Entitlements-JWT": ent,
-        "X-Riot-ClientVersion": ver,
-        "X-Riot-ClientPlatform": plat_b64,
-    }
     # v3 は POST を試す（空 JSON で OK）
-    return _pd_post(session, url, headers, json_body={})
+    return _pd_post(session, url, json_headers, json_body={})
+
+
+# ---------------- Storefront version cache ----------------
+# shard ごとに v2/v3 のどちらが通ったかを覚えておき、外れの 1 往復を省く
+_storefront_versions: Optional[Dict[str, str]] = None
+_storefront_versions_lock = threading.Lock()
+
+
+def _write_cache_file(path: Path, data: bytes) -> None:
+    """一時ファイルに書いてから os.replace で差し替える（途中で落ちても壊れたキャッシュを残さない）"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+
+def _storefront_versions_path() -> Path:
+    return CACHE_DIR / "endpoint.json"
+
+
+def _storefront_version_for(shard: str) -> Optional[str]:
+    global _storefront_versions
+    if _storefront_versions is None:
+        with _storefront_versions_lock:
+            if _storefront_versions is None:
+                try:
+                    data = orjson.loads(_storefront_versions_path().read_bytes())
+                    _storefront_versions = dict(data.get("storefront") or {})
+                except FileNotFoundError:
+                    _storefront_versions = {}
+                except Exception as e:
+                    log.debug("endpoint cache unreadable: %r", e)
+                    _storefront_versions = {}
+    return _storefront_versions.get(shard)
+
+
+def _remember_storefront_version(shard: str, ver: str) -> None:
+    if _storefront_version_for(shard) == ver:
+        return
+    with _storefront_versions_lock:
+        assert _storefront_versions is not None
+        _storefront_versions[shard] = ver
+        snapshot = dict(_storefront_versions)
+    try:
+        _write_cache_file(_storefront_versions_path(), orjson.dumps({"storefront": snapshot}))
+    except Exception as e:
+        log.debug("endpoint cache write failed: %r", e)
+
+
+# ---------------- Token / account cache ----------------
+# reauth で得た access/entitlements トークン（有効期限 ~1h）を短時間使い回す。
+# shard と PUUID はアカウントに固定なので、トークンが切れた後も長めに覚えておき PAS/userinfo を省く。
+# キーは (discord_user_id, ssid) なので、Cookie が保存し直されれば自然に別エントリになる。
+TOKEN_CACHE_TTL = float(os.getenv("RIOT_TOKEN_CACHE_TTL", "1800"))  # seconds
+ACCOUNT_CACHE_TTL = 24 * 3600.0  # seconds
+
+_token_cache: Dict[Tuple[str, str], Tuple[float, Dict[str, Any]]] = {}
+_account_cache: Dict[Tuple[str, str], Tuple[float, Tuple[str, str]]] = {}  # -> (shard, puuid)
+_token_cache_lock = threading.Lock()
+
+
+def _ttl_get(cache: Dict[Any, Tuple[float, Any]], key: Any) -> Any:
+    with _token_cache_lock:
+        hit = cache.get(key)
+        if hit is None:
+            return None
+        if hit[0] < time.monotonic():
+            del cache[key]
+            return None
+        return hit[1]
+
+
+def _ttl_put(cache: Dict[Any, Tuple[float, Any]], key: Any, value: Any, ttl: float) -> None:
+    if ttl <= 0:
+        return
+    with _token_cache_lock:
+        now = time.monotonic()
+        # 期限切れを掃除（エントリ数はアクティブユーザー数程度）
+        for k in [k for k, (exp, _) in cache.items() if exp < now]:
+            del cache[k]
+        cache[key] = (now + ttl, value)
+
+
+def _token_cache_invalidate(key: Tuple[str, str]) -> None:
+    with _token_cache_lock:
+        _token_cache.pop(key, None)
 
 
 # ---------------- Public APIs ----------------
@@ -463,56 +650,93 @@ def get_storefront(discord_user_id: str, auto_fetch_puuid: bool = True) -> Dict[
     """
     # ---- load envs ----
     db_env = _load_env_from_db(discord_user_id)
-    file_env: Optional[Dict[str, Optional[str]]] = None
+    file_env: Optional[RiotCreds] = None
     try:
         file_env = _load_env_from_file(discord_user_id)
     except Exception:
         # ファイルが無くても続行
         pass
 
-    def _attempt(env: Dict[str, Optional[str]], ua: Optional[str], *, only_ssid: bool) -> Dict[str, Any]:
-        if not env.get("ssid"):
-            raise ValueError("Missing SSID in cookies.")
-        session = _new_session(user_agent=ua)
+    def _login(session: requests.Session, env: RiotCreds, key: Tuple[str, str]) -> Dict[str, Any]:
         # ★ 常に FULL（ssid+clid/sub/csid/tdid）で積む
         _set_full_cookies(session, env)
-
         # Reauth
         access_token, id_token = _reauth_get_tokens(session)
-        # Tokens & shard
-        entitlements = _get_entitlements_token(session, access_token)
-        shard = _get_shard(session, access_token, id_token)
-        # Client headers
-        client_version = _get_client_version(session)
-        client_platform_b64 = _build_client_platform_b64()
-        # PUUID
-        puuid = env.get("puuid")
-        if not puuid and auto_fetch_puuid:
-            puuid = _get_puuid(session, access_token)
-        if not puuid:
-            raise ValueError("PUUID not provided and auto-fetch disabled.")
-        # storefront: v2 → 404/405 なら v3
-        resp = _get_storefront_v2(
-            session, shard, puuid, access_token, entitlements, client_version, client_platform_b64
-        )
-        log.debug(
-            "storefront v2: %s %s -> %s Allow=%s",
-            getattr(resp.request, "method", "?"),
-            getattr(resp.request, "url", "?"),
-            resp.status_code,
-            resp.headers.get("Allow"),
-        )
-        if resp.status_code in (404, 405):
-            resp = _get_storefront_v3(
-                session, shard, puuid, access_token, entitlements, client_version, client_platform_b64
+        # Bearer ヘッダは 1 回だけ組み立てて各呼び出しで共有する（requests は渡した dict を書き換えない）
+        auth = {"Authorization": f"Bearer {access_token}"}
+        # reauth 後の entitlements / shard / PUUID は互いに独立なので並列に取る。
+        # shard/PUUID を覚えていれば entitlements だけでよい
+        account = _ttl_get(_account_cache, key)
+        if account is not None:
+            shard, puuid = account
+            entitlements = _get_entitlements_token(session, auth)
+        else:
+            puuid = env.puuid
+            ent_f = _IO_POOL.submit(_get_entitlements_token, session, auth)
+            shard_f = _IO_POOL.submit(_get_shard, session, auth, id_token)
+            puuid_f = (
+                _IO_POOL.submit(_get_puuid, session, auth)
+                if not puuid and auto_fetch_puuid
+                else None
             )
+            entitlements = ent_f.result()
+            shard = shard_f.result()
+            if puuid_f is not None:
+                puuid = puuid_f.result()
+            if not puuid:
+                raise ValueError("PUUID not provided and auto-fetch disabled.")
+            _ttl_put(_account_cache, key, (shard, puuid), ACCOUNT_CACHE_TTL)
+        creds = {"access": access_token, "ent": entitlements, "shard": shard, "puuid": puuid}
+        _ttl_put(_token_cache, key, creds, TOKEN_CACHE_TTL)
+        return creds
+
+    def _storefront(session: requests.Session, creds: Dict[str, Any], client_version: str) -> requests.Response:
+        # PD ヘッダはトークンと client version が変わらない間は同じ dict（_pd_headers のキャッシュ）
+        headers, json_headers = _pd_headers(creds["access"], creds["ent"], client_version)
+        # storefront: 前回その shard で通った版を先に叩き、404/405 ならもう一方
+        shard = creds["shard"]
+        puuid = creds["puuid"]
+        order = ("v3", "v2") if _storefront_version_for(shard) == "v3" else ("v2", "v3")
+        for ver in order:
+            if ver == "v3":
+                resp = _get_storefront_v3(session, shard, puuid, json_headers)
+            else:
+                resp = _get_storefront_v2(session, shard, puuid, headers)
             log.debug(
-                "storefront v3: %s %s -> %s Allow=%s",
+                "storefront %s: %s %s -> %s Allow=%s",
+                ver,
                 getattr(resp.request, "method", "?"),
                 getattr(resp.request, "url", "?"),
                 resp.status_code,
                 resp.headers.get("Allow"),
             )
+            if resp.status_code not in (404, 405):
+                if resp.ok:
+                    _remember_storefront_version(shard, ver)
+                break
+        return resp
+
+    def _attempt(env: RiotCreds, ua: Optional[str], *, only_ssid: bool) -> Dict[str, Any]:
+        ssid = env.ssid
+        if not ssid:
+            raise ValueError("Missing SSID in cookies.")
+        session = _new_riot_session(ua)
+        # client version はユーザーに依存しないので reauth と並行して取る
+        ver_f = _IO_POOL.submit(_get_client_version, _VALAPI_SESSION)
+        key = (discord_user_id, ssid)
+        creds = _ttl_get(_token_cache, key)
+        cached = creds is not None
+        if creds is None:
+            creds = _login(session, env, key)
+        client_version = ver_f.result()
+
+        resp = _storefront(session, creds, client_version)
+        if cached and resp.status_code in (401, 403):
+            # キャッシュしたトークンが失効していた: 破棄して 1 回だけ reauth からやり直す
+            log.debug("cached tokens rejected (%s); reauthenticating", resp.status_code)
+            _token_cache_invalidate(key)
+            creds = _login(session, env, key)
+            resp = _storefront(session, creds, client_version)
         if resp.status_code == 403:
             raise RuntimeError("Storefront 403: Forbidden. Check IP/cookies/region.")
         if resp.status_code == 405:
@@ -522,11 +746,11 @@ def get_storefront(discord_user_id: str, auto_fetch_puuid: bool = True) -> Dict[
                 f"X-Riot-ClientVersion={client_version!r}"
             )
         resp.raise_for_status()
-        return resp.json()
+        return _json(resp)
 
     # ★ 最短ルートのみ：DB + DBUA + FULL（UA未保存なら既定UAでFULL）
-    db_user_agent = db_env.get("user_agent")
-    attempts: List[Tuple[Dict[str, Optional[str]], Optional[str], bool, str]] = [
+    db_user_agent = db_env.user_agent
+    attempts: List[Tuple[RiotCreds, Optional[str], bool, str]] = [
         (
             db_env,
             db_user_agent if db_user_agent else None,
@@ -538,7 +762,7 @@ def get_storefront(discord_user_id: str, auto_fetch_puuid: bool = True) -> Dict[
     last_err: Optional[Exception] = None
     for env, ua, only_ssid, label in attempts:
         try:
-            log.debug("Attempt: %s (ssid=%s, ua=%s)", label, _mask(env.get("ssid")), _mask(ua))
+            log.debug("Attempt: %s (ssid=%s, ua=%s)", label, _mask(env.ssid), _mask(ua))
             return _attempt(env, ua, only_ssid=False)  # ★ 常に FULL 固定
         except Exception as e:
             last_err = e
@@ -563,55 +787,232 @@ def _price_vp(offer: Dict[str, Any]) -> Optional[int]:
     return None
 
 
-def _build_skin_info_index(session: requests.Session, lang: str = "en-US") -> Dict[str, Dict[str, Optional[str]]]:
-    idx: Dict[str, Dict[str, Optional[str]]] = {}
-    r = session.get(f"{VALAPI_BASE}/v1/weapons/skins", params={"language": lang}, timeout=TIMEOUT)
-    r.raise_for_status()
-    for skin in r.json().get("data") or []:
-        name = skin.get("displayName")
-        icon = skin.get("displayIcon")
-        if not icon:
-            levels = skin.get("levels") or []
-            if levels:
-                icon = (levels[0] or {}).get("displayIcon")
+SkinInfo = Tuple[str, Optional[str]]  # (name, icon)
+SkinIndex = Mapping[str, SkinInfo]  # 共有キャッシュなので読み取り専用（MappingProxyType）で渡す
+
+# lang -> (client_version, etag, index)。プロセス内ではディスクも読まない
+_skin_index_mem: Dict[str, Tuple[Optional[str], Optional[str], SkinIndex]] = {}
+# 再検証/取得は同時に 1 本だけ。待っていた側はロック取得後にメモリのキャッシュを拾う
+_skin_index_lock = threading.Lock()
+
+
+def _index_skins(payload: Dict[str, Any]) -> SkinIndex:
+    # /v1/weapons/skins はスキン単位。ストアの ItemID はスキンレベル UUID なので、
+    # スキン本体・レベル・クロマの UUID すべてから同じスキンの (name, icon) を引けるようにする。
+    # アイコンはスキン本体のもの、無ければ最初のレベルのもの。値のタプルはスキン内で共有する
+    idx: Dict[str, SkinInfo] = {}
+    put = idx.__setitem__
+    intern = sys.intern
+    for skin in payload.get("data") or []:
         skin_uuid = skin.get("uuid")
-        if not name or not skin_uuid:
+        name = skin.get("displayName")
+        if not skin_uuid or not name:
             continue
-        info = {"name": name, "icon": icon}
-        idx[str(skin_uuid).lower()] = info
-        for lv in (skin.get("levels") or []):
-            u = (lv or {}).get("uuid")
-            if u:
-                idx[str(u).lower()] = info
-        for ch in (skin.get("chromas") or []):
-            u = (ch or {}).get("uuid")
+        levels = skin.get("levels") or []
+        icon = skin.get("displayIcon")
+        if not icon and levels:
+            icon = (levels[0] or {}).get("displayIcon")
+        info = (intern(name), icon)
+        put(str(skin_uuid).lower(), info)
+        for sub in chain(levels, skin.get("chromas") or []):
+            u = (sub or {}).get("uuid")
             if u:
-                idx[str(u).lower()] = info
-    return idx
+                put(str(u).lower(), info)
+    return MappingProxyType(idx)
+
+
+def _skin_cache_path(lang: str) -> Path:
+    return CACHE_DIR / f"skins_{lang}.json"
+
+
+def _read_skin_cache(lang: str) -> Optional[Tuple[Optional[str], Optional[str], SkinIndex]]:
+    try:
+        data = orjson.loads(_skin_cache_path(lang).read_bytes())
+        # JSON ではタプルが配列になるので戻す（形が違う古いファイルは例外→読み直し）
+        intern = sys.intern
+        idx = {k: (intern(v[0]), v[1]) for k, v in data["index"].items()}
+        return data.get("version"), data.get("etag"), MappingProxyType(idx)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        log.debug("skin cache unreadable (%s): %r", lang, e)
+        return None
+
+
+def _write_skin_cache(lang: str, version: Optional[str], etag: Optional[str], idx: SkinIndex) -> None:
+    try:
+        _write_cache_file(_skin_cache_path(lang), orjson.dumps({"version": version, "etag": etag, "index": dict(idx)}))
+    except Exception as e:
+        log.debug("skin cache write failed (%s): %r", lang, e)
+
+
+def _build_skin_info_index(
+    session: requests.Session,
+    lang: str = "en-US",
+    client_version: Optional[str] = None,
+) -> SkinIndex:
+    """
+    スキン/スキンレベル/クロマ uuid -> スキンの (name, icon) の索引。
+    クライアントバージョンが変わっていなければメモリ/ディスクのキャッシュをそのまま返し、
+    変わっていれば ETag 付きの条件付き GET で再検証する（304 ならキャッシュを継続利用）。
+    """
+    if client_version is None:
+        try:
+            client_version = _get_client_version(session)
+        except Exception as e:
+            log.debug("client version lookup failed, revalidating skin index: %r", e)
+
+    hit = _skin_index_mem.get(lang)
+    if hit and client_version and hit[0] == client_version:
+        return hit[2]
+
+    with _skin_index_lock:
+        cached = _skin_index_mem.get(lang) or _read_skin_cache(lang)
+        if cached and client_version and cached[0] == client_version:
+            _skin_index_mem[lang] = cached
+            return cached[2]
+
+        headers = {"If-None-Match": cached[1]} if cached and cached[1] else None
+        r = session.get(
+            f"{VALAPI_BASE}/v1/weapons/skins", params={"language": lang}, headers=headers, timeout=TIMEOUT
+        )
+        if r.status_code == 304 and cached:
+            idx, etag = cached[2], cached[1]
+        else:
+            r.raise_for_status()
+            # 大きめの JSON なので orjson で bytes から直接デコードする
+            idx, etag = _index_skins(_json(r)), r.headers.get("ETag")
+
+        entry = (client_version, etag, idx)
+        _skin_index_mem[lang] = entry
+        _write_skin_cache(lang, *entry)
+        return idx
+
+
+@lru_cache(maxsize=4096)
+def _skin_level_info(level_uuid: str, lang: str = "en-US") -> Optional[SkinInfo]:
+    """
+    ストアの ItemID（スキンレベル UUID）1 件だけを引く。日替わりストアは重複が多いのでプロセス内で覚えておく。
+    404 は None（キャッシュされる）、それ以外の失敗は例外（キャッシュされない）。
+    """
+    r = _VALAPI_SESSION.get(
+        f"{VALAPI_BASE}/v1/weapons/skinlevels/{level_uuid}", params={"language": lang}, timeout=TIMEOUT
+    )
+    if r.status_code == 404:
+        return None
+    r.raise_for_status()
+    data = _json(r).get("data") or {}
+    name = data.get("displayName")
+    if not name:
+        return None
+    return sys.intern(name), data.get("displayIcon")
+
+
+def _pick_from_index(idx: SkinIndex, uuids: List[str]) -> Dict[str, SkinInfo]:
+    # 索引のキーは小文字。Riot の UUID も通常は小文字なので完全一致を先に試し、外れたときだけ lower() する
+    out: Dict[str, SkinInfo] = {}
+    get = idx.get
+    for u in uuids:
+        info = get(u) or get(u.lower())
+        if info:
+            out[u] = info
+    return out
+
+
+def _refresh_skin_index_if_stale(lang: str, index_version: Optional[str]) -> None:
+    """メモリの索引が現在のクライアントバージョンより古ければ、裏で再検証（ETag 付き）を走らせる"""
+    cv = _client_version
+    if cv is not None and cv[0] > time.monotonic() and cv[1] == index_version:
+        return
+    if _skin_index_lock.locked():
+        return  # 既に再検証/取得中
+
+    def _run() -> None:
+        try:
+            _build_skin_info_index(_VALAPI_SESSION, lang)
+        except Exception as e:
+            log.debug("skin index refresh failed (%s): %r", lang, e)
+
+    _IO_POOL.submit(_run)
 
 
-def get_store_items(discord_user_id: str) -> List[Dict[str, Any]]:
+def _lookup_skin_infos(uuids: List[str], lang: str = "en-US") -> Dict[str, SkinInfo]:
+    """
+    uuid -> (name, icon)（キーは渡された uuid そのまま）。全件索引がメモリにあればまずそこから引き、
+    索引に無いもの（索引未作成・パッチで増えたスキン）は skinlevels/{uuid} を並列に引く。
+    それでも引けなかったものだけ全件索引（必要なら再検証）で補う。
+    """
+    found: Dict[str, SkinInfo] = {}
+    cached = _skin_index_mem.get(lang)
+    if cached:
+        found = _pick_from_index(cached[2], uuids)
+        _refresh_skin_index_if_stale(lang, cached[0])
+
+    missing = [u for u in uuids if u not in found]
+    if not missing:
+        return found
+    futures = {u: _IO_POOL.submit(_skin_level_info, u, lang) for u in missing}
+    for u, fut in futures.items():
+        try:
+            info = fut.result()
+        except Exception as e:
+            log.debug("skinlevel lookup failed for %s: %r", u, e)
+            continue
+        if info:
+            found[u] = info
+    missing = [u for u in missing if u not in found]
+    if missing:
+        found.update(_pick_from_index(_build_skin_info_index(_VALAPI_SESSION, lang), missing))
+    return found
+
+
+def _first_weapon_skin_uuid(offer: Dict[str, Any]) -> Optional[str]:
+    """offer の Rewards から最初の武器スキン UUID を返す（無ければ None）"""
+    return next(
+        (rw.get("ItemID") for rw in (offer.get("Rewards") or ()) if rw.get("ItemTypeID") == ITEMTYPE_WEAPON_SKIN),
+        None,
+    )
+
+
+class StoreItem(NamedTuple):
+    name: str
+    price: Optional[int]
+    icon: Optional[str]
+
+
+def prewarm(lang: str = "en-US") -> threading.Thread:
+    """
+    スキン索引をバックグラウンドで用意しておく（起動直後の最初の /store が索引構築を待たないように）。
+    失敗しても何もしない（その場合は従来どおり UUID 単位で引く）。
+    """
+    def _run() -> None:
+        try:
+            _build_skin_info_index(_VALAPI_SESSION, lang)
+        except Exception as e:
+            log.warning("skin index prewarm failed: %r", e)
+
+    t = threading.Thread(target=_run, name="skin-index-prewarm", daemon=True)
+    t.start()
+    return t
+
+
+def get_store_items(discord_user_id: str) -> List[StoreItem]:
     store = get_storefront(discord_user_id, auto_fetch_puuid=True)
     skins = (store.get("SkinsPanelLayout") or {})
     offers = skins.get("SingleItemStoreOffers") or []
     if not isinstance(offers, list) or not offers:
         return []
-    api_session = _new_session()
-    info_idx = _build_skin_info_index(api_session, lang="en-US")
-    items: List[Dict[str, Any]] = []
-    for offer in offers:
-        skin_uuid: Optional[str] = None
-        for rw in (offer.get("Rewards") or []):
-            if rw.get("ItemTypeID") == ITEMTYPE_WEAPON_SKIN:
-                skin_uuid = rw.get("ItemID")
-                break
-        if not skin_uuid:
-            continue
-        info = info_idx.get(str(skin_uuid).lower())
-        name = info["name"] if info else str(skin_uuid)
-        icon = info.get("icon") if info else None
-        price = _price_vp(offer)
-        items.append({"name": name, "price": price, "icon": icon})
+    # (UUID, offer)。武器スキン以外の offer は落とす
+    picked: List[Tuple[str, Dict[str, Any]]] = [
+        (str(u), offer) for offer in offers if (u := _first_weapon_skin_uuid(offer))
+    ]
+    # 全件索引がメモリにあればそこから引き、無いものだけ UUID 単位で引く（起動時に prewarm で索引を用意する）
+    infos = _lookup_skin_infos([skin_uuid for skin_uuid, _ in picked], lang="en-US")
+    items: List[StoreItem] = []
+    for skin_uuid, offer in picked:
+        # 名前が引けなかったスキンは UUID をそのまま表示する
+        name, icon = infos.get(skin_uuid) or (skin_uuid, None)
+        items.append(StoreItem(name, _price_vp(offer), icon))
     return items
 
 
@@ -633,11 +1034,7 @@ if __name__ == "__main__":
             print("item offers が見つかりませんでした。")
             sys.exit(0)
         for idx, offer in enumerate(offers, start=1):
-            skin_uuid = None
-            for rw in (offer.get("Rewards") or []):
-                if rw.get("ItemTypeID") == ITEMTYPE_WEAPON_SKIN:
-                    skin_uuid = rw.get("ItemID")
-                    break
+            skin_uuid = _first_weapon_skin_uuid(offer)
             if not skin_uuid:
                 continue
             price = _price_vp(offer)
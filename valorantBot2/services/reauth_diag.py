@@ -3,6 +3,7 @@ from __future__ import annotations
 
 import os
 import re
+from functools import lru_cache
 from pathlib import Path
 from typing import Optional, Dict, Tuple, List
 
@@ -10,6 +11,16 @@ import requests
 from requests.adapters import HTTPAdapter, Retry
 from .net_diag import get_public_ip, mask_ip
 
+# DB cookie loader（UA付きがあれば優先）
+try:
+    from .cookiesDB import get_cookies_and_meta as _db_get_cookies_and_meta
+except Exception:
+    _db_get_cookies_and_meta = None
+try:
+    from .cookiesDB import get_cookies as _db_get_cookies
+except Exception:
+    _db_get_cookies = None
+
 # Riot endpoints
 AUTH_URL_LEGACY = "https://auth.riotgames.com/api/v1/authorization"
 AUTH_URL_V2     = "https://auth.riotgames.com/authorize"
@@ -46,8 +57,13 @@ def _new_session(ua: Optional[str]) -> requests.Session:
     )))
     return s
 
+_TOKEN_RE = {
+    "access_token": re.compile(r"access_token=([^&]+)"),
+    "id_token": re.compile(r"id_token=([^&]+)"),
+}
+
 def _extract(uri: str, key: str) -> Optional[str]:
-    m = re.search(rf"{re.escape(key)}=([^&]+)", uri)
+    m = _TOKEN_RE[key].search(uri)
     return m.group(1) if m else None
 
 def _mask(v: Optional[str]) -> str:
@@ -127,20 +143,17 @@ def _load_db(discord_user_id: str) -> Dict[str,str]:
     """
     DB から cookie と UA を取得する。get_cookies_and_meta があれば優先。
     """
-    try:
-        from .cookiesDB import get_cookies_and_meta as _get_meta  # type: ignore
-    except Exception:
-        _get_meta = None
-
     cookies, ua = None, None
-    if _get_meta:
-        meta = _get_meta(str(discord_user_id))
+    if _db_get_cookies_and_meta:
+        meta = _db_get_cookies_and_meta(str(discord_user_id))
         if meta:
             cookies = meta.get("cookies") or {}
             ua = meta.get("user_agent")
     if cookies is None:
-        from .cookiesDB import get_cookies as _get_cookies  # type: ignore
-        cookies = _get_cookies(str(discord_user_id))
+        get_cookies = _db_get_cookies
+        if get_cookies is None:
+            from .cookiesDB import get_cookies  # type: ignore
+        cookies = get_cookies(str(discord_user_id))
 
     # 正規化（lower/upper 両対応）
     out = {
@@ -154,33 +167,35 @@ def _load_db(discord_user_id: str) -> Dict[str,str]:
     }
     return out
 
-def _candidate_paths(discord_user_id: str) -> List[Path]:
+def _base_dirs() -> Tuple[Path, ...]:
     here = Path(__file__).resolve()
-    paths = [
-        here.parent / "cookies" / f"{discord_user_id}.txt",             # services/cookies/
-        here.parent.parent / "cookies" / f"{discord_user_id}.txt",      # repo_root/cookies/
-        Path.cwd() / "cookies" / f"{discord_user_id}.txt",              # CWD/cookies/
+    dirs = [
+        here.parent / "cookies",             # services/cookies/
+        here.parent.parent / "cookies",      # repo_root/cookies/
+        Path.cwd() / "cookies",              # CWD/cookies/
     ]
     envdir = os.getenv("VALORANT_COOKIES_DIR")
     if envdir:
-        paths.insert(0, Path(envdir) / f"{discord_user_id}.txt")
-    # dedupe
-    uniq, seen = [], set()
-    for p in paths:
-        if p not in seen:
-            uniq.append(p); seen.add(p)
-    return uniq
+        dirs.insert(0, Path(envdir))
+    # dedupe（順序は維持）
+    return tuple(dict.fromkeys(dirs))
+
+# 探索ディレクトリは import 時に一度だけ解決し、ファイル名だけを UID ごとに組み立てる
+_BASE_DIRS = _base_dirs()
+
+@lru_cache(maxsize=1024)
+def _candidate_paths(discord_user_id: str) -> Tuple[Path, ...]:
+    name = f"{discord_user_id}.txt"
+    return tuple(d / name for d in _BASE_DIRS)
+
+# KEY=VALUE 行だけを拾う（# コメント行・空行はキーにマッチしないので自然に除外される）
+_KV_RE = re.compile(rb"(?m)^[ \t]*([A-Z_][A-Z0-9_]*)[ \t]*=[ \t]*(.*?)[ \t\r]*$")
 
 def _load_file(discord_user_id: str) -> Optional[Dict[str,str]]:
     for p in _candidate_paths(discord_user_id):
         try:
             if not p.exists(): continue
-            raw: Dict[str,str] = {}
-            for line in p.read_text(encoding="utf-8").splitlines():
-                line = line.strip()
-                if not line or line.startswith("#") or "=" not in line: continue
-                k, v = line.split("=", 1)
-                raw[k.strip()] = v.strip()
+            raw: Dict[str,str] = {k.decode(): v.decode("utf-8") for k, v in _KV_RE.findall(p.read_bytes())}
             return {
                 "ssid": raw.get("RIOT_SSID") or raw.get("SSID") or "",
                 "clid": raw.get("RIOT_CLID") or raw.get("CLID") or "",
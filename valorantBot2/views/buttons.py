@@ -118,12 +118,12 @@ class StoreButtonView(ui.View):
             # 1メッセージで複数 Embed
             embeds = []
             for item in items[:4]:
-                embed = discord.Embed(title=item["name"])
-                price = item["price"]
+                embed = discord.Embed(title=item.name)
+                price = item.price
                 price_str = f"{price} VP" if price is not None else "N/A"
                 embed.add_field(name="Price", value=price_str, inline=False)
-                if item.get("icon"):
-                    embed.set_thumbnail(url=item["icon"])
+                if item.icon:
+                    embed.set_thumbnail(url=item.icon)
                 embeds.append(embed)
             await interaction.followup.send(embeds=embeds, ephemeral=True)
 